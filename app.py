@@ -2,8 +2,11 @@ import streamlit as st
 import numpy as np
 import seaborn as sns
 
-from data import get_tickers,get_ticker_info,get_expiries,get_valid,get_iv_surface,get_market_data,get_smile_values
+from data import get_tickers,get_ticker_info,get_expiries,get_valid,get_iv_surface,get_market_data,get_smile_values,get_price_history,market_time
 from pricing import black_scholes_price,calc_greeks
+from fourier import get_heston_smile
+from backtest import run_backtest
+from profiling import profile_run,requested
 from plot import plot_bs_price_heatmap,plot_pnl_heatmap,plot_iv_surface,plot_greeks,plot_volatility_smile
 
 sns.set_style("whitegrid")
@@ -188,12 +191,25 @@ def show_analysis_tab(ticker,spot,strike,T,r,sigma,option_type):
         fig = plot_pnl_heatmap(strikes_heatmap, times_heatmap, pnl, f"{option_type.title()} P&L Analysis")
         st.pyplot(fig)
 
+        # Delta-Hedged Backtest
+        st.subheader("Delta-Hedged Backtest", help="Replays this option, delta-hedged at different frequencies, over every window of the last two years of prices. Shows the distribution of hedged P&L per share.")
+        closes = get_price_history(ticker, '2y')
+        if closes is not None and len(closes) > 2:
+            days_held = max(1, min(int(T*252), len(closes) - 2))
+            result = run_backtest(closes, (float(strike)/spot,), (1, 2, 5, 10), (sigma,), days_held, r, option_type.lower())
+            summary = result['summary'].drop(columns=['moneyness', 'vol']).rename(columns={'hedge_every': 'Hedge Every (days)'})
+            st.dataframe(summary.round(4), hide_index=True)
+            st.caption(f"{result['windows']} windows of {days_held} trading days, {result['hedge_steps']:,} hedge steps in {result['seconds']}s")
+        else:
+            st.info("Not enough price history for a hedging backtest.")
+
         # Plot Volatility Smile
-        st.subheader("Volatility Smile", help="Shows how implied volatility changes with strike price. Compares predicted (model) and actual (market) IV.")
+        st.subheader("Volatility Smile", help="Shows how implied volatility changes with strike price. Compares predicted (model) and actual (market) IV, along with a Heston model fitted to the whole IV surface.")
         with st.spinner('Generating Volatility Smile plot...'):
             valid_strikes, predicted_ivs, actual_ivs_filtered = get_smile_values(ticker, expiry, option_type, r)
             if len(valid_strikes) > 1:
-                fig = plot_volatility_smile(valid_strikes, predicted_ivs, actual_ivs_filtered, spot, float(strike), title=f"Volatility Smile ({option_type.title()})")
+                heston_ivs = get_heston_smile(ticker, expiry, tuple(valid_strikes), option_type, r)
+                fig = plot_volatility_smile(valid_strikes, predicted_ivs, actual_ivs_filtered, spot, float(strike), title=f"Volatility Smile ({option_type.title()})", heston_ivs=heston_ivs)
                 st.pyplot(fig)
             else:
                 st.info("Not enough data to plot volatility smile.")
@@ -203,7 +219,7 @@ def show_analysis_tab(ticker,spot,strike,T,r,sigma,option_type):
         with st.spinner('Generating IV surface plot...'):
             iv_surface = get_iv_surface(ticker)
             if iv_surface:
-                fig = plot_iv_surface(iv_surface)
+                fig = plot_iv_surface(iv_surface, today=market_time(ticker))
                 st.pyplot(fig)
 
     
@@ -269,72 +285,76 @@ def show_about_tab():
 
 if __name__ == "__main__":
 
-    st.title("💎 Prismetrics : Option Analysis \n Your Strategic Lens into Option Markets")
+    profile = requested(st.query_params)
+    if "profile" in st.query_params:
+        # ?profile= is a one-off: drop it so the next rerun is not profiled too
+        del st.query_params["profile"]
+    with profile_run(enabled=profile is not None, label=profile) as profile_tags:
 
-    st.sidebar.header("Visualisation Parameters")
+        st.title("💎 Prismetrics : Option Analysis \n Your Strategic Lens into Option Markets")
 
-    with st.spinner('Loading available tickers...'):
-        if 'tickers' not in st.session_state:
-            st.session_state.tickers = get_tickers()
+        st.sidebar.header("Visualisation Parameters")
 
-    tickers_list = [f"{k} ({v})" for k,v in st.session_state.tickers.items()]
+        with st.spinner('Loading available tickers...'):
+            if 'tickers' not in st.session_state:
+                st.session_state.tickers = get_tickers()
+
+        tickers_list = [f"{k} ({v})" for k,v in st.session_state.tickers.items()]
     
-    selected = st.sidebar.selectbox("Stock", tickers_list,help="Select a company to analyze. Ticker symbol followed by company name.")
-    ticker = selected.split("(")[0].strip()
+        selected = st.sidebar.selectbox("Stock", tickers_list,help="Select a company to analyze. Ticker symbol followed by company name.")
+        ticker = selected.split("(")[0].strip()
+        profile_tags['ticker'] = ticker
 
-    with st.spinner('Loading expiry dates...'):
-        expiries = get_expiries(ticker)
+        with st.spinner('Loading expiry dates...'):
+            expiries = get_expiries(ticker)
 
-    expiry = st.sidebar.selectbox("Expiry",expiries,help="Option expiration date. Longer dates cost more but give more time.")
+        expiry = st.sidebar.selectbox("Expiry",expiries,help="Option expiration date. Longer dates cost more but give more time.")
+        profile_tags['expiry'] = expiry
 
-    standard_rates = [round(x, 4) for x in np.arange(0.00, 0.1501, 0.0025)]
+        standard_rates = [round(x, 4) for x in np.arange(0.00, 0.1501, 0.0025)]
 
-    default_r_index = standard_rates.index(0.05) if 0.05 in standard_rates else 0
+        default_r_index = standard_rates.index(0.05) if 0.05 in standard_rates else 0
 
-    r = st.sidebar.selectbox("Select Risk-Free Rate",standard_rates,index=default_r_index,format_func=lambda x: f"{x*100:.2f}%",help="Current interest rate used in option pricing calculations."
-    )
+        r = st.sidebar.selectbox("Select Risk-Free Rate",standard_rates,index=default_r_index,format_func=lambda x: f"{x*100:.2f}%",help="Current interest rate used in option pricing calculations."
+        )
 
     
-    with st.spinner('Loading valid strikes...'):
-        strikes, call_ivs, put_ivs = get_valid(ticker, expiry, r)
-        if not strikes:
-            st.error("No valid strikes available.")
-            exit()
+        with st.spinner('Loading valid strikes...'):
+            strikes, call_ivs, put_ivs = get_valid(ticker, expiry, r)
+            if not strikes:
+                st.error("No valid strikes available.")
+                exit()
     
-    strike  = st.sidebar.selectbox("Strike",strikes,help="Price at which you can buy or sell the stock.")
+        strike  = st.sidebar.selectbox("Strike",strikes,help="Price at which you can buy or sell the stock.")
 
-    vol_source = st.sidebar.radio("Volatility",["Historical","Implied"],help="Past price movements or market's future expectations.")
+        vol_source = st.sidebar.radio("Volatility",["Historical","Implied"],help="Past price movements or market's future expectations.")
 
-    option_type = st.sidebar.radio("Type",["Call","Put"],help="Call: Right to buy. Put: Right to sell.")
+        option_type = st.sidebar.radio("Type",["Call","Put"],help="Call: Right to buy. Put: Right to sell.")
 
 
-    with st.spinner('Loading market data...'):
-        spot,T,hist_vol,imp_vol = get_market_data(ticker,expiry,strike,r,option_type)
+        with st.spinner('Loading market data...'):
+            spot,T,hist_vol,imp_vol = get_market_data(ticker,expiry,strike,r,option_type)
 
-        if None in (spot,T,hist_vol,imp_vol):
-            st.error("Could not load market data")
-            exit()
+            if None in (spot,T,hist_vol,imp_vol):
+                st.error("Could not load market data")
+                exit()
 
-    sigma = hist_vol if vol_source == "Historical" else imp_vol
-    days = int(T*365)
+        sigma = hist_vol if vol_source == "Historical" else imp_vol
+        days = int(T*365)
     
-    tab_options,tab_pricing,tab_analysis,tab_help,tab_about = st.tabs(["Company Info","Pricing & Greeks","Analysis","Help","About"])
+        tab_options,tab_pricing,tab_analysis,tab_help,tab_about = st.tabs(["Company Info","Pricing & Greeks","Analysis","Help","About"])
 
-    with tab_options:
-        show_company_tab(ticker,spot,vol_source,sigma,days)
+        with tab_options:
+            show_company_tab(ticker,spot,vol_source,sigma,days)
     
-    with tab_pricing:
-        show_pricing_tab(spot,strike,T,r,sigma,option_type)
+        with tab_pricing:
+            show_pricing_tab(spot,strike,T,r,sigma,option_type)
     
-    with tab_analysis:
-        show_analysis_tab(ticker,spot,strike,T,r,sigma,option_type)
-
-    with tab_help:
-        show_help_tab()
-
-    with tab_about:
-        show_about_tab()
-
-
+        with tab_analysis:
+            show_analysis_tab(ticker,spot,strike,T,r,sigma,option_type)
 
+        with tab_help:
+            show_help_tab()
 
+        with tab_about:
+            show_about_tab()
@@ -0,0 +1,111 @@
+import time
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from pricing import black_scholes_price_delta
+
+TRADING_DAYS = 252
+
+
+def hedge_pnl(closes, moneyness=(0.9, 0.95, 1.0, 1.05, 1.1), hedge_every=(1, 2, 5), vols=(0.2,), days=21, r=0.05, option_type="call", position=1, stride=1, chunk=256):
+    # Delta-hedged P&L of an option opened at every stride-th close and held for `days` closes.
+    # Returns an array shaped (windows, moneyness, vols, hedge_every), discounted to the open date.
+    closes = np.asarray(closes, dtype=float)
+    if len(closes) <= days:
+        return np.empty((0, len(moneyness), len(vols), len(hedge_every)))
+
+    paths = sliding_window_view(closes, days + 1)[::stride]
+    m = np.asarray(moneyness, dtype=float)[None, :, None, None]
+    sigma = np.asarray(vols, dtype=float)[None, None, :, None]
+
+    t = np.arange(days + 1)/TRADING_DAYS
+    T = (t[-1] - t[:-1])[None, None, None, :]
+    discount = np.exp(-r*t)
+
+    # Hedge ratio held over each step: the delta from the last rebalance
+    held_at = np.array([(np.arange(days)//h)*h for h in hedge_every])
+
+    out = []
+    for start in range(0, len(paths), chunk):
+        path = paths[start:start + chunk]
+        S = path[:, None, None, :-1]
+        K = path[:, 0][:, None, None, None]*m
+
+        price, delta = black_scholes_price_delta(S, K, T, r, sigma, option_type)
+        held = delta[..., held_at]
+        gains = np.diff(path*discount, axis=1)
+        hedge = np.einsum('wmvfd,wd->wmvf', held, gains)
+
+        ST = path[:, -1][:, None, None]
+        K = K[..., 0]
+        payoff = np.maximum(ST - K, 0) if option_type == "call" else np.maximum(K - ST, 0)
+        option = discount[-1]*payoff - price[..., 0]
+
+        out.append(position*(option[..., None] - hedge))
+
+    return np.concatenate(out)
+
+
+def summarize(pnl, moneyness, hedge_every, vols):
+    W = pnl.shape[0]
+    if W == 0:
+        return pd.DataFrame(columns=['moneyness', 'vol', 'hedge_every', 'mean', 'std', 'p05', 'p50', 'p95', 'win_rate'])
+    index = pd.MultiIndex.from_product([moneyness, vols, hedge_every], names=['moneyness', 'vol', 'hedge_every'])
+    flat = pnl.reshape(W, -1)
+    return pd.DataFrame({
+        'mean': flat.mean(axis=0),
+        'std': flat.std(axis=0),
+        'p05': np.percentile(flat, 5, axis=0),
+        'p50': np.percentile(flat, 50, axis=0),
+        'p95': np.percentile(flat, 95, axis=0),
+        'win_rate': (flat > 0).mean(axis=0),
+    }, index=index).reset_index()
+
+
+def run_backtest(closes, moneyness=(0.9, 0.95, 1.0, 1.05, 1.1), hedge_every=(1, 2, 5), vols=(0.2,), days=21, r=0.05, option_type="call", position=1, stride=1):
+    start = time.perf_counter()
+    pnl = hedge_pnl(closes, moneyness, hedge_every, vols, days, r, option_type, position, stride)
+    elapsed = time.perf_counter() - start
+
+    steps = pnl.size*days
+    return {
+        'pnl': pnl,
+        'summary': summarize(pnl, moneyness, hedge_every, vols),
+        'windows': pnl.shape[0],
+        'hedge_steps': steps,
+        'seconds': round(elapsed, 4),
+        'steps_per_sec': round(steps/elapsed) if steps and elapsed > 0 else None,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from data import get_price_history
+    from volatility import historical_volatility
+
+    parser = argparse.ArgumentParser(description="Backtest discrete delta hedging over historical closes")
+    parser.add_argument("ticker", nargs="?", default="AAPL")
+    parser.add_argument("--period", default="5y")
+    parser.add_argument("--days", type=int, default=21, help="holding period in trading days")
+    parser.add_argument("--hedge-every", type=int, nargs="+", default=[1, 2, 5, 10])
+    parser.add_argument("--moneyness", type=float, nargs="+", default=[0.9, 0.95, 1.0, 1.05, 1.1])
+    parser.add_argument("--vols", type=float, nargs="+", help="defaults to 0.8x, 1x and 1.2x the historical vol")
+    parser.add_argument("--type", default="call", choices=["call", "put"])
+    parser.add_argument("--short", action="store_true", help="hedge a short option instead of a long one")
+    parser.add_argument("--rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    closes = get_price_history(args.ticker, args.period)
+    if closes is None or len(closes) <= args.days:
+        print(f"Not enough price history for {args.ticker}")
+        raise SystemExit(1)
+
+    vols = args.vols or [round(historical_volatility(closes)*f, 4) for f in (0.8, 1.0, 1.2)]
+    result = run_backtest(closes, args.moneyness, args.hedge_every, vols, args.days, args.rate, args.type, -1 if args.short else 1)
+
+    pd.set_option("display.width", 160)
+    print(result['summary'].round(4).to_string(index=False))
+    print(f"\n{result['windows']} windows, {result['hedge_steps']:,} hedge steps in {result['seconds']}s ({result['steps_per_sec']:,} steps/s)")
@@ -0,0 +1,133 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+# Process-wide cache shared by every session. Results are frozen when stored: lists become tuples and
+# dicts become read-only mappingproxies, so cached functions (get_valid, get_tickers, get_iv_surface, ...)
+# return those types. DataFrames come back as shallow copies; pandas 3's copy-on-write (see
+# requirements.txt) keeps writes to them away from the cached data.
+
+MAX_BYTES = int(float(os.environ.get("PRISMETRICS_CACHE_MB", 512)) * 1024 * 1024)
+
+lock = threading.RLock()
+entries = OrderedDict()   # key -> (value, size, expires, has_frames)
+loading = {}              # key -> lock held while the value is computed
+stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'bytes': 0}
+
+
+def freeze(value):
+    # Converts a result into an immutable equivalent; returns (frozen, size, has_frames)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        size = value.memory_usage(deep=True)
+        return value, int(size.sum() if isinstance(size, pd.Series) else size), True
+    if isinstance(value, np.ndarray):
+        value = value.view()
+        value.flags.writeable = False
+        return value, value.nbytes, False
+    if isinstance(value, (dict, MappingProxyType)):
+        frozen, size, frames = {}, sys.getsizeof(value), False
+        for k, v in value.items():
+            frozen[k], s, f = freeze(v)
+            size += s + sys.getsizeof(k)
+            frames = frames or f
+        return MappingProxyType(frozen), size, frames
+    if isinstance(value, (list, tuple)):
+        items = [freeze(v) for v in value]
+        frozen = tuple(v for v, _, _ in items)
+        return frozen, sys.getsizeof(frozen) + sum(s for _, s, _ in items), any(f for _, _, f in items)
+    return value, sys.getsizeof(value), False
+
+
+def view(value):
+    # Per-hit read-only view: only containers holding pandas objects are rebuilt, nothing is deep-copied
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, MappingProxyType):
+        return MappingProxyType({k: view(v) for k, v in value.items()})
+    if isinstance(value, tuple):
+        return tuple(view(v) for v in value)
+    return value
+
+
+def evict(budget):
+    while entries and stats['bytes'] > budget:
+        _, (_, size, _, _) = entries.popitem(last=False)
+        stats['bytes'] -= size
+        stats['evictions'] += 1
+
+
+def lookup(key):
+    with lock:
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] is not None and entry[2] < time.monotonic():
+            del entries[key]
+            stats['bytes'] -= entry[1]
+            stats['expired'] += 1
+            return None
+        entries.move_to_end(key)
+        stats['hits'] += 1
+        return entry
+
+
+def store(key, result, ttl):
+    value, size, frames = freeze(result)
+    entry = (value, size, time.monotonic() + ttl if ttl else None, frames)
+    with lock:
+        stats['misses'] += 1
+        if size <= MAX_BYTES:
+            old = entries.pop(key, None)
+            if old is not None:
+                stats['bytes'] -= old[1]
+            entries[key] = entry
+            stats['bytes'] += size
+            evict(MAX_BYTES)
+    return entry
+
+
+def shared_cache(ttl=3600):
+    def decorator(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            entry = lookup(key)
+            if entry is None:
+                # One session computes a missing entry while others asking for it wait
+                with lock:
+                    key_lock = loading.setdefault(key, threading.Lock())
+                try:
+                    with key_lock:
+                        entry = lookup(key)
+                        if entry is None:
+                            entry = store(key, fn(*args, **kwargs), ttl)
+                finally:
+                    with lock:
+                        loading.pop(key, None)
+            value, _, _, frames = entry
+            return view(value) if frames else value
+
+        wrapper.clear = lambda: clear(name)
+        return wrapper
+    return decorator
+
+
+def clear(name=None):
+    with lock:
+        for key in [k for k in entries if name is None or k[0] == name]:
+            stats['bytes'] -= entries.pop(key)[1]
+
+
+def cache_info():
+    with lock:
+        total = stats['hits'] + stats['misses']
+        return dict(stats, entries=len(entries), max_bytes=MAX_BYTES, hit_rate=round(stats['hits'] / total, 4) if total else None)
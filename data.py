@@ -1,24 +1,63 @@
 import os
+import json
+import numpy as np
 import pandas as pd
 import yfinance as yf
 from datetime import datetime 
-import streamlit as st
-from volatility import live_historical_volatility,implied_volatility
+from volatility import historical_volatility,live_close_prices,implied_volatility
+from quality import check_quotes,reason_counts
+from cache import shared_cache
 
-@st.cache_data(ttl=3600)
+# Recorded snapshots (see stream.py) to serve instead of live market data
+REPLAY = os.environ.get("PRISMETRICS_REPLAY")
+
+
+@shared_cache(ttl=None)
+def get_replay(path):
+    snapshots = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                snapshot = json.loads(line)
+                snapshots[snapshot['ticker']] = snapshot   # latest snapshot per ticker wins
+
+    return snapshots
+
+
+def replay_snapshot(ticker):
+    return get_replay(REPLAY).get(ticker)
+
+
+def market_time(ticker):
+    # "Now" for a ticker's data: the recording time when replaying, otherwise None (the current clock)
+    if REPLAY:
+        snapshot = replay_snapshot(ticker)
+        if snapshot:
+            return datetime.fromtimestamp(snapshot['time'])
+    return None
+
+
+@shared_cache(ttl=3600)
 def get_tickers():
     folder = os.path.dirname(__file__)
     file_path = os.path.join(folder,'tickers.csv')
 
     df = pd.read_csv(file_path)
+    tickers = dict(zip(df['Symbol'],df['Name']))
 
-    return dict(zip(df['Symbol'],df['Name']))
+    if REPLAY:
+        return {t: tickers.get(t, t) for t in get_replay(REPLAY)}
+    return tickers
 
 
-@st.cache_data(ttl=3600)
+@shared_cache(ttl=3600)
 def get_ticker_info(ticker):
-    stock = yf.Ticker(ticker)
-    info = stock.info
+    if REPLAY:
+        snapshot = replay_snapshot(ticker)
+        info = snapshot.get('info', {}) if snapshot else {}
+    else:
+        stock = yf.Ticker(ticker)
+        info = stock.info
 
     return {
         'name': info.get('longName', 'N/A'),
@@ -32,8 +71,12 @@ def get_ticker_info(ticker):
     }
 
 
-@st.cache_data(ttl=3600)
+@shared_cache(ttl=3600)
 def get_spot_price(ticker):
+    if REPLAY:
+        snapshot = replay_snapshot(ticker)
+        return snapshot['spot'] if snapshot else None
+
     stock = yf.Ticker(ticker)
     data = stock.history(period='1d')
 
@@ -42,14 +85,18 @@ def get_spot_price(ticker):
     return None
 
 
-@st.cache_data(ttl=3600)
+@shared_cache(ttl=3600)
 def get_expiries(ticker):
     try:
-        stock = yf.Ticker(ticker)
-        expiries = stock.options
+        if REPLAY:
+            snapshot = replay_snapshot(ticker)
+            expiries = sorted({q['expiry'] for q in snapshot['quotes']}) if snapshot else []
+        else:
+            stock = yf.Ticker(ticker)
+            expiries = stock.options
         valid = []
         for expiry in expiries:
-            if datetime.strptime(expiry, '%Y-%m-%d') > datetime.now():
+            if datetime.strptime(expiry, '%Y-%m-%d') > (market_time(ticker) or datetime.now()):
                 valid.append(expiry)
         return valid
     except Exception as e:
@@ -57,8 +104,17 @@ def get_expiries(ticker):
         return []
 
 
-@st.cache_data(ttl=3600)
+@shared_cache(ttl=3600)
 def get_option_chain(ticker, expiry):
+    if REPLAY:
+        snapshot = replay_snapshot(ticker)
+        if snapshot is None:
+            return None
+        quotes = pd.DataFrame([q for q in snapshot['quotes'] if q['expiry'] == expiry])
+        if quotes.empty:
+            return None
+        return {'calls':quotes[quotes['type'] == 'call'].reset_index(drop=True),'puts':quotes[quotes['type'] == 'put'].reset_index(drop=True)}
+
     stock = yf.Ticker(ticker)
     chain = stock.option_chain(expiry)
 
@@ -68,7 +124,7 @@ def get_option_chain(ticker, expiry):
     return {'calls':call_df,'puts':put_df}
 
 
-@st.cache_data(ttl=3600)
+@shared_cache(ttl=3600)
 def get_valid(ticker, expiry, r=0.05):
     chain = get_option_chain(ticker, expiry)
     spot = get_spot_price(ticker)
@@ -76,35 +132,34 @@ def get_valid(ticker, expiry, r=0.05):
     if chain is None or spot is None:
         return None, None, None
 
-    call_strikes = chain['calls']['strike'].unique()
-    put_strikes = chain['puts']['strike'].unique()
-    all_strikes = sorted(set(call_strikes) | set(put_strikes))
+    today = market_time(ticker)
+    T = get_time_to_expiry(expiry, today)
+
+    # Only quotes that pass the quality checks are handed to the solver
+    ivs = {}
+    for option_type, df in (("call", chain['calls']), ("put", chain['puts'])):
+        checked = check_quotes(df, spot, T, r, option_type, now=today)
+        quotes = checked[checked['reason'] == ""]
+        if len(quotes) < len(checked):
+            counts = reason_counts(checked)
+            counts.pop('ok', None)
+            print(f"Dropped {len(checked) - len(quotes)} {ticker} {expiry} {option_type} quotes: {counts}")
+        ivs[option_type] = {}
+        for strike, price in zip(quotes['strike'], quotes['price']):
+            ivs[option_type][strike] = implied_volatility(spot, strike, T, r, price, option_type)
 
     final_valid_strike = []
     call_ivs = []
     put_ivs = []
 
-    for strike in all_strikes:
-        if 0.5 * spot <= strike <= 1.5 * spot:
-            call = chain['calls'][chain['calls']['strike'] == strike]   
-            put = chain['puts'][chain['puts']['strike'] == strike]
-
-            call_iv = None
-            put_iv = None
+    for strike in sorted(set(ivs["call"]) | set(ivs["put"])):
+        call_iv = ivs["call"].get(strike)
+        put_iv = ivs["put"].get(strike)
 
-            if not call.empty:
-                call_price = call['lastPrice'].iloc[0]
-                T = get_time_to_expiry(expiry)
-                call_iv = implied_volatility(spot, strike, T, r, call_price, "call")
-            if not put.empty:
-                put_price = put['lastPrice'].iloc[0]
-                T = get_time_to_expiry(expiry)
-                put_iv = implied_volatility(spot, strike, T, r, put_price, "put")
-
-            if (call_iv is not None and call_iv > 0) or (put_iv is not None and put_iv > 0):
-                final_valid_strike.append(strike)
-                call_ivs.append(call_iv)
-                put_ivs.append(put_iv)
+        if (call_iv is not None and call_iv > 0) or (put_iv is not None and put_iv > 0):
+            final_valid_strike.append(strike)
+            call_ivs.append(call_iv)
+            put_ivs.append(put_iv)
 
     if not final_valid_strike:
         return None, None, None
@@ -112,8 +167,8 @@ def get_valid(ticker, expiry, r=0.05):
     return final_valid_strike, call_ivs, put_ivs
 
 
-def get_time_to_expiry(expiry_date):
-    today = datetime.now()
+def get_time_to_expiry(expiry_date, today=None):
+    today = today or datetime.now()
     expiry = datetime.strptime(expiry_date,"%Y-%m-%d")
 
     days = (expiry - today).days
@@ -122,7 +177,7 @@ def get_time_to_expiry(expiry_date):
     return round(time,4)
 
 
-@st.cache_data(ttl=3600)
+@shared_cache(ttl=3600)
 def get_iv_surface(ticker):
     expiries = get_expiries(ticker)
 
@@ -143,31 +198,52 @@ def get_iv_surface(ticker):
     return iv_surface
 
 
-@st.cache_data(ttl=3600)
+@shared_cache(ttl=3600)
+def get_price_history(ticker,period='1y'):
+    if REPLAY:
+        snapshot = replay_snapshot(ticker)
+        if not snapshot:
+            return None
+        return np.array(snapshot.get('history', []), dtype=float)
+
+    return live_close_prices(ticker,period)
+
+
+@shared_cache(ttl=3600)
+def get_historical_volatility(ticker,period='1y'):
+    close_prices = get_price_history(ticker,period)
+    if close_prices is None or len(close_prices) < 2:
+        return None
+
+    return historical_volatility(close_prices)
+
+
+@shared_cache(ttl=3600)
 def get_market_data(ticker,expiry,strike,r,option_type):
     spot = get_spot_price(ticker)
     chain = get_option_chain(ticker,expiry)
     if chain is None or spot is None:
         return None,None,None,None
 
+    option_type = option_type.lower()
     options = chain['calls'] if option_type=="call" else chain['puts'] 
-    T = get_time_to_expiry(expiry)
+    today = market_time(ticker)
+    T = get_time_to_expiry(expiry, today)
 
-    hist_vol = live_historical_volatility(ticker,'1y')
+    hist_vol = get_historical_volatility(ticker,'1y')
 
-    option_data = options[options['strike'] == strike]
-    if not option_data.empty:
-        price = option_data['lastPrice'].values[0]
-        imp_vol = implied_volatility(spot, strike, T, r, price, option_type)
-        if imp_vol is None:
-            imp_vol = hist_vol
-    else:
+    # The selected contract goes through the same quality checks as get_valid
+    option_data = check_quotes(options[options['strike'] == strike], spot, T, r, option_type, now=today)
+    imp_vol = None
+    if not option_data.empty and option_data['reason'].iloc[0] == "":
+        imp_vol = implied_volatility(spot, strike, T, r, option_data['price'].iloc[0], option_type)
+    if imp_vol is None:
         imp_vol = hist_vol
         
     return spot, T, hist_vol, imp_vol
 
 
-@st.cache_data(ttl=3600)
+@shared_cache(ttl=3600)
 def get_smile_values(ticker, expiry, option_type, r):
     strikes, call_ivs, put_ivs = get_valid(ticker, expiry, r)
     if strikes is None:
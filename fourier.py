@@ -0,0 +1,206 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from scipy.optimize import least_squares
+from scipy.stats import norm
+
+from cache import shared_cache
+from data import get_time_to_expiry,get_iv_surface,get_spot_price,market_time
+from pricing import black_scholes_price
+from volatility import implied_volatility
+
+HESTON_PARAMS = ['v0','kappa','theta','sigma','rho']
+HESTON_BOUNDS = ([1e-4, 0.01, 1e-4, 0.01, -0.999], [4.0, 20.0, 4.0, 5.0, 0.999])
+MIN_T = 7/365   # shorter expiries are left out of calibration and have no model smile
+
+
+# Characteristic functions of the log-return ln(S_T/S), vectorized over u and T
+
+def bs_cf(u, T, r, sigma):
+    iu = 1j*u
+    return np.exp(iu*(r - 0.5*sigma**2)*T - 0.5*sigma**2*u**2*T)
+
+
+def heston_cf(u, T, r, v0, kappa, theta, sigma, rho):
+    # "Little Heston trap" form, which stays on the principal branch of the log
+    iu = 1j*u
+    beta = kappa - rho*sigma*iu
+    d = np.sqrt(beta**2 + sigma**2*(iu + u**2))
+    g = (beta - d)/(beta + d)
+    e = np.exp(-d*T)
+    C = kappa*theta/sigma**2*((beta - d)*T - 2*np.log((1 - g*e)/(1 - g)))
+    D = (beta - d)/sigma**2*(1 - e)/(1 - g*e)
+    return np.exp(iu*r*T + C + D*v0)
+
+
+MODELS = {'black_scholes': bs_cf, 'heston': heston_cf}
+
+
+class FFTGrid:
+    # Carr-Madan grid on log-moneyness k = ln(K/S); everything here depends only on N, eta and alpha
+    def __init__(self, N=4096, eta=0.25, alpha=1.5):
+        self.N = N
+        self.alpha = alpha
+        self.lam = 2*np.pi/(N*eta)
+        v = eta*np.arange(N)
+        b = N*self.lam/2
+        self.k = -b + self.lam*np.arange(N)
+
+        simpson = 3 + (-1)**(np.arange(N) + 1)
+        simpson[0] = 1
+        self.weights = simpson*eta/3*np.exp(1j*v*b)
+        self.denom = alpha**2 + alpha - v**2 + 1j*(2*alpha + 1)*v
+        self.u = v - (alpha + 1)*1j
+        self.damping = np.exp(-alpha*self.k)/np.pi
+
+    def calls(self, cf_values, T, r):
+        # Call prices per unit spot on the k grid; cf_values has shape (..., N), T broadcasts against (...)
+        T = np.asarray(T, dtype=float)
+        psi = np.exp(-r*T)[..., None]*cf_values/self.denom
+        return self.damping*np.fft.fft(psi*self.weights, axis=-1).real
+
+    def locate(self, S, strikes):
+        # Four-point Lagrange weights around each strike; linear interpolation is too coarse near the money
+        pos = (np.log(np.asarray(strikes, dtype=float)/S) - self.k[0])/self.lam
+        index = np.clip(np.floor(pos).astype(int), 1, self.N - 3)
+        t = (pos - index)[:, None]
+        weights = np.hstack([-t*(t - 1)*(t - 2)/6, (t + 1)*(t - 1)*(t - 2)/2, -(t + 1)*t*(t - 2)/2, (t + 1)*t*(t - 1)/6])
+        return index[:, None] + np.arange(-1, 3), weights
+
+    def interpolate(self, grid_prices, index, weights, rows=None):
+        values = grid_prices[..., index] if rows is None else grid_prices[rows[:, None], index]
+        return np.sum(values*weights, axis=-1)
+
+
+DEFAULT_GRID = FFTGrid()
+
+
+def fft_prices(model, params, S, strikes, T, r, option_type="call", grid=None):
+    # Prices every strike of one expiry from a single FFT
+    grid = grid or DEFAULT_GRID
+    strikes = np.asarray(strikes, dtype=float)
+    cf_values = MODELS[model](grid.u, T, r, *params)
+    index, weights = grid.locate(S, np.atleast_1d(strikes))
+    calls = S*grid.interpolate(grid.calls(cf_values, T, r), index, weights)
+    if option_type == "call":
+        return calls
+    return calls - S + strikes*np.exp(-r*T)
+
+
+def surface_points(iv_surface, spot, today=None, min_T=MIN_T):
+    # Out-of-the-money quotes from a get_iv_surface snapshot as flat arrays
+    Ts, strikes, ivs, is_call = [], [], [], []
+    for expiry, (ks, call_ivs, put_ivs) in iv_surface.items():
+        T = get_time_to_expiry(expiry, today)
+        if T < min_T:
+            continue
+        for K, call_iv, put_iv in zip(ks, call_ivs, put_ivs):
+            call = K >= spot
+            iv = call_iv if call else put_iv
+            if iv is None:
+                iv, call = (put_iv, False) if call else (call_iv, True)
+            if iv is None or not 0.01 < iv < 3:
+                continue
+            Ts.append(T)
+            strikes.append(K)
+            ivs.append(iv)
+            is_call.append(call)
+
+    return np.array(Ts), np.array(strikes, dtype=float), np.array(ivs), np.array(is_call, dtype=bool)
+
+
+def calibrate_heston(iv_surface, spot, r=0.05, today=None, grid=None, x0=None):
+    grid = grid or DEFAULT_GRID
+    start = time.perf_counter()
+
+    T, K, iv, is_call = surface_points(iv_surface, spot, today)
+    if len(T) < len(HESTON_PARAMS):
+        return None
+
+    # Everything that does not depend on the parameters is computed once, outside the optimizer loop
+    expiries, row = np.unique(T, return_inverse=True)
+    index, weights = grid.locate(spot, K)
+    discount = np.exp(-r*T)
+    sqrt_T = np.sqrt(T)
+    d1 = (np.log(spot/K) + (r + 0.5*iv**2)*T)/(iv*sqrt_T)
+    market_calls = spot*norm.cdf(d1) - K*discount*norm.cdf(d1 - iv*sqrt_T)
+    market = np.where(is_call, market_calls, market_calls - spot + K*discount)
+    vega = np.maximum(spot*sqrt_T*norm.pdf(d1), 1e-4*spot)
+    parity = np.where(is_call, 0.0, K*discount - spot)
+
+    def residuals(x):
+        # One batched FFT prices every expiry; residuals are vega-scaled, i.e. roughly IV errors
+        cf_values = heston_cf(grid.u[None, :], expiries[:, None], r, *x)
+        grid_calls = grid.calls(cf_values, expiries, r)
+        calls = spot*grid.interpolate(grid_calls, index, weights, row)
+        return (calls + parity - market)/vega
+
+    if x0 is None:
+        atm = np.median(iv[np.abs(np.log(K/spot)) < 0.1]) if np.any(np.abs(np.log(K/spot)) < 0.1) else np.median(iv)
+        x0 = [atm**2, 2.0, atm**2, 0.5, -0.5]
+    x0 = np.clip(x0, *HESTON_BOUNDS)
+
+    fit = least_squares(residuals, x0, bounds=HESTON_BOUNDS, x_scale=[0.05, 1.0, 0.05, 0.3, 0.3])
+
+    result = dict(zip(HESTON_PARAMS, (float(p) for p in fit.x)))
+    result.update({
+        'rmse_iv': float(np.sqrt(np.mean(fit.fun**2))),
+        'points': int(len(T)),
+        'expiries': int(len(expiries)),
+        'evaluations': int(fit.nfev),
+        'seconds': round(time.perf_counter() - start, 3),
+    })
+    return result
+
+
+def heston_smile(params, S, strikes, T, r, option_type="call", grid=None):
+    # Model IVs for the given strikes of one expiry, from a calibrate_heston result
+    values = [params[p] for p in HESTON_PARAMS]
+    prices = fft_prices('heston', values, S, strikes, T, r, option_type, grid)
+    return [implied_volatility(S, K, T, r, price, option_type) for K, price in zip(strikes, prices)]
+
+
+@shared_cache(ttl=3600)
+def get_heston_fit(ticker, r=0.05):
+    iv_surface = get_iv_surface(ticker)
+    spot = get_spot_price(ticker)
+    if not iv_surface or spot is None:
+        return None
+    return calibrate_heston(iv_surface, spot, r, market_time(ticker))
+
+
+@shared_cache(ttl=3600)
+def get_heston_smile(ticker, expiry, strikes, option_type, r=0.05):
+    fit = get_heston_fit(ticker, r)
+    spot = get_spot_price(ticker)
+    T = get_time_to_expiry(expiry, market_time(ticker))
+    if fit is None or T < MIN_T:
+        return None
+    return heston_smile(fit, spot, strikes, T, r, option_type.lower())
+
+
+if __name__ == "__main__":
+    S = 100
+    r = 0.05
+    strikes = np.linspace(60, 140, 81)
+
+    for T in (30/365, 0.5, 2.0):
+        bs = np.array([black_scholes_price(S, K, T, r, 0.2, "call") for K in strikes])
+        fft = fft_prices('black_scholes', [0.2], S, strikes, T, r)
+        print(f"BS vs FFT, T={T:.3f}: max abs error {np.max(np.abs(bs - fft)):.2e}")
+
+    true = [0.04, 1.5, 0.06, 0.6, -0.7]
+    surface = {}
+    now = datetime.now()
+    for days in (30, 60, 91, 182, 365, 730):
+        expiry = (now + timedelta(days=days + 1)).strftime('%Y-%m-%d')
+        T = get_time_to_expiry(expiry)
+        ks = list(np.round(np.linspace(70, 130, 25), 2))
+        calls = heston_smile(dict(zip(HESTON_PARAMS, true)), S, ks, T, r, "call")
+        puts = heston_smile(dict(zip(HESTON_PARAMS, true)), S, ks, T, r, "put")
+        surface[expiry] = (ks, calls, puts)
+
+    fit = calibrate_heston(surface, S, r)
+    print("True:  ", dict(zip(HESTON_PARAMS, true)))
+    print("Fitted:", fit)
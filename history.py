@@ -0,0 +1,260 @@
+import os
+import time
+import fcntl
+from datetime import date as Date
+
+import numpy as np
+import pandas as pd
+
+from data import get_iv_surface,get_spot_price,get_tickers,market_time
+from fourier import surface_points
+
+HISTORY_DIR = os.environ.get("PRISMETRICS_HISTORY", os.path.join(os.path.dirname(os.path.abspath(__file__)), "history"))
+
+TENORS = [30, 60, 91, 182, 365]
+SKEW_TENORS = [30, 91]
+
+# One append-only binary file per column; a row is complete once every column has it.
+# append() cuts partial rows off before writing, so an interrupted write never shifts later rows.
+COLUMNS = {'date': np.int32, 'ticker': np.int32, 'spot': np.float64}
+COLUMNS.update({f'atm_iv_{d}': np.float32 for d in TENORS})
+COLUMNS.update({f'skew_{d}': np.float32 for d in SKEW_TENORS})
+COLUMNS['term_slope'] = np.float32
+
+loaded = {}   # (folder, rows) -> sorted view of the store
+
+
+def summarize_surface(iv_surface, spot, today=None):
+    # ATM IV at standard tenors (total variance interpolated between listed expiries), 90/110 skew and term slope
+    T, K, iv, _ = surface_points(iv_surface, spot, today, min_T=1/365)
+    summary = {name: np.nan for name in COLUMNS if name not in ('date', 'ticker')}
+    summary['spot'] = float(spot)
+    if len(T) == 0:
+        return summary
+
+    k = np.log(K/spot)
+    expiries, atm, skew = [], [], []
+    for t in np.unique(T):
+        sel = T == t
+        order = np.argsort(k[sel])
+        ks, ivs = k[sel][order], iv[sel][order]
+        if len(ks) < 2 or not ks[0] <= 0 <= ks[-1]:
+            continue
+        expiries.append(t)
+        atm.append(np.interp(0, ks, ivs))
+        lo, hi = np.log(0.9), np.log(1.1)
+        skew.append(np.interp(lo, ks, ivs) - np.interp(hi, ks, ivs) if ks[0] <= lo and ks[-1] >= hi else np.nan)
+
+    if not expiries:
+        return summary
+
+    expiries, atm, skew = np.array(expiries), np.array(atm), np.array(skew)
+    variance = atm**2*expiries
+    for d in TENORS:
+        t = d/365
+        if expiries[0] <= t <= expiries[-1]:
+            summary[f'atm_iv_{d}'] = float(np.sqrt(np.interp(t, expiries, variance)/t))
+    ok = ~np.isnan(skew)
+    for d in SKEW_TENORS:
+        t = d/365
+        if ok.sum() >= 1 and expiries[ok][0] <= t <= expiries[ok][-1]:
+            summary[f'skew_{d}'] = float(np.interp(t, expiries[ok], skew[ok]))
+    # Vol points per year between the 30-day and 182-day ATM IVs
+    summary['term_slope'] = (summary['atm_iv_182'] - summary['atm_iv_30'])/((182 - 30)/365)
+    return summary
+
+
+def column_rows(folder):
+    # Rows every column file has; a missing file counts as empty
+    sizes = []
+    for name, dtype in COLUMNS.items():
+        path = os.path.join(folder, f'{name}.bin')
+        sizes.append(os.path.getsize(path)//np.dtype(dtype).itemsize if os.path.exists(path) else 0)
+    return min(sizes)
+
+
+def ticker_ids(folder=HISTORY_DIR):
+    path = os.path.join(folder, 'tickers.txt')
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return f.read().split()
+
+
+def append(rows, folder=HISTORY_DIR):
+    # rows: list of dicts with 'date', 'ticker' and summary columns
+    if not rows:
+        return 0
+    os.makedirs(folder, exist_ok=True)
+
+    # The lock on tickers.txt serializes appends, so concurrent runs neither interleave rows nor share ticker ids
+    with open(os.path.join(folder, 'tickers.txt'), 'a+') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            return append_locked(rows, folder, lock)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def append_locked(rows, folder, tickers_file):
+    rows_before = column_rows(folder)
+    for name, dtype in COLUMNS.items():
+        path = os.path.join(folder, f'{name}.bin')
+        if os.path.exists(path) and os.path.getsize(path) > rows_before*np.dtype(dtype).itemsize:
+            os.truncate(path, rows_before*np.dtype(dtype).itemsize)
+
+    tickers_file.seek(0)
+    names = tickers_file.read().split()
+    ids = {t: i for i, t in enumerate(names)}
+    new = [r['ticker'] for r in rows if r['ticker'] not in ids]
+    for t in dict.fromkeys(new):
+        ids[t] = len(ids)
+    if new:
+        tickers_file.write("".join(f"{t}\n" for t in dict.fromkeys(new)))
+        tickers_file.flush()
+
+    values = {
+        'date': [np.datetime64(r['date'], 'D').astype(np.int64) for r in rows],
+        'ticker': [ids[r['ticker']] for r in rows],
+    }
+    for name in COLUMNS:
+        if name not in values:
+            values[name] = [r.get(name, np.nan) for r in rows]
+
+    for name, dtype in COLUMNS.items():
+        with open(os.path.join(folder, f'{name}.bin'), 'ab') as f:
+            np.asarray(values[name], dtype=dtype).tofile(f)
+    return len(rows)
+
+
+def load(folder=HISTORY_DIR):
+    # Memory-maps every column; rows are put in (ticker, date) order with the latest write for a day winning
+    if not os.path.exists(os.path.join(folder, 'date.bin')):
+        return None
+
+    rows = column_rows(folder)
+    key = (os.path.abspath(folder), rows)
+    if key in loaded:
+        return loaded[key]
+
+    columns = {name: np.memmap(os.path.join(folder, f'{name}.bin'), dtype=dtype, mode='r', shape=(rows,)) if rows else np.empty(0, dtype)
+               for name, dtype in COLUMNS.items()}
+
+    order = np.lexsort((np.arange(rows), columns['date'], columns['ticker']))
+    tickers, dates = columns['ticker'][order], columns['date'][order]
+    last = np.ones(rows, dtype=bool)
+    last[:-1] = (tickers[1:] != tickers[:-1]) | (dates[1:] != dates[:-1])
+    order = order[last]
+
+    store = {'columns': columns, 'order': order, 'ticker': columns['ticker'][order], 'date': columns['date'][order], 'names': ticker_ids(folder)}
+    loaded.clear()
+    loaded[key] = store
+    return store
+
+
+def column(store, name):
+    return np.asarray(store['columns'][name][store['order']], dtype=np.float64)
+
+
+def iv_rank(value='atm_iv_30', asof=None, lookback=365, folder=HISTORY_DIR):
+    # IV rank and percentile of the latest value per ticker against its own lookback window (calendar days)
+    empty = pd.DataFrame(columns=['ticker', 'date', value, 'low', 'high', 'iv_rank', 'iv_percentile', 'observations'])
+    store = load(folder)
+    if store is None or not len(store['order']):
+        return empty
+
+    end = np.datetime64(asof or Date.today(), 'D').astype(np.int64)
+    values = column(store, value)
+    keep = (store['date'] <= end) & (store['date'] > end - lookback) & ~np.isnan(values)
+    tickers, dates, values = store['ticker'][keep], store['date'][keep], values[keep]
+    if not len(values):
+        return empty
+
+    starts = np.flatnonzero(np.r_[True, tickers[1:] != tickers[:-1]])
+    ends = np.r_[starts[1:], len(values)]
+    counts = ends - starts
+    current = values[ends - 1]
+    low = np.minimum.reduceat(values, starts)
+    high = np.maximum.reduceat(values, starts)
+    below = np.add.reduceat((values < np.repeat(current, counts)).astype(np.int64), starts)
+
+    span = high - low
+    names = np.array(store['names'])
+    return pd.DataFrame({
+        'ticker': names[tickers[starts]],
+        'date': (dates[ends - 1]).astype('datetime64[D]'),
+        value: current,
+        'low': low,
+        'high': high,
+        'iv_rank': np.where(span > 0, (current - low)/np.where(span > 0, span, 1), np.nan),
+        'iv_percentile': np.where(counts > 1, below/np.maximum(counts - 1, 1), np.nan),
+        'observations': counts,
+    })
+
+
+def term_structure(ticker, start=None, end=None, folder=HISTORY_DIR):
+    # Daily history of one ticker's ATM term structure, skew and slope
+    store = load(folder)
+    names = store['names'] if store else []
+    if ticker not in names:
+        return pd.DataFrame()
+
+    tid = names.index(ticker)
+    lo, hi = np.searchsorted(store['ticker'], [tid, tid + 1])
+    dates = store['date'][lo:hi]
+    if start is not None:
+        lo += np.searchsorted(dates, np.datetime64(start, 'D').astype(np.int64))
+    if end is not None:
+        hi = lo + np.searchsorted(store['date'][lo:hi], np.datetime64(end, 'D').astype(np.int64), side='right')
+
+    rows = store['order'][lo:hi]
+    data = {'date': store['date'][lo:hi].astype('datetime64[D]')}
+    for name in COLUMNS:
+        if name not in ('date', 'ticker'):
+            data[name] = np.asarray(store['columns'][name][rows])
+    return pd.DataFrame(data).set_index('date')
+
+
+def record(tickers=None, day=None, folder=HISTORY_DIR):
+    # Summarizes today's surface for each ticker (from the shared cache when warm) and appends it
+    day = day or Date.today()
+    rows = []
+    for ticker in tickers or list(get_tickers()):
+        try:
+            iv_surface = get_iv_surface(ticker)
+            spot = get_spot_price(ticker)
+        except Exception as e:
+            print(f"Error fetching surface for {ticker}: {str(e)}")
+            continue
+        if not iv_surface or spot is None:
+            continue
+        rows.append(dict(summarize_surface(iv_surface, spot, market_time(ticker)), date=day, ticker=ticker))
+    return append(rows, folder)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Daily IV surface history: record summaries and query IV rank / term structure")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="append today's surface summary for tickers (default: all of tickers.csv)")
+    rec.add_argument("tickers", nargs="*")
+    rank = sub.add_parser("rank", help="IV rank and percentile across every recorded ticker")
+    rank.add_argument("--value", default="atm_iv_30", choices=[c for c in COLUMNS if c not in ('date', 'ticker', 'spot')])
+    rank.add_argument("--asof")
+    rank.add_argument("--lookback", type=int, default=365)
+    term = sub.add_parser("term", help="term-structure history for one ticker")
+    term.add_argument("ticker")
+    term.add_argument("--start")
+    term.add_argument("--end")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "record":
+        print(f"Recorded {record(args.tickers or None)} tickers")
+    elif args.command == "rank":
+        df = iv_rank(args.value, args.asof, args.lookback)
+        print(df.sort_values('iv_rank', ascending=False).to_string(index=False))
+    else:
+        print(term_structure(args.ticker, args.start, args.end).to_string())
+    print(f"({time.perf_counter() - start:.3f}s)")
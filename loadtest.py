@@ -0,0 +1,242 @@
+import os
+import gc
+import json
+import math
+import random
+import resource
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from pricing import black_scholes_price
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+
+def make_replay(path, n_tickers=10, n_expiries=6, seed=0):
+    # Writes a synthetic snapshot file in the stream.py format so the app can run with no network
+    rng = np.random.default_rng(seed)
+    folder = os.path.dirname(os.path.abspath(__file__))
+    tickers = pd.read_csv(os.path.join(folder, 'tickers.csv'))['Symbol'].tolist()[:n_tickers]
+
+    today = datetime.now()
+    fridays = [today + timedelta(days=d) for d in range(7, 400) if (today + timedelta(days=d)).weekday() == 4]
+    expiries = [d.strftime('%Y-%m-%d') for d in fridays[::max(1, len(fridays) // n_expiries)][:n_expiries]]
+    traded = today.strftime('%Y-%m-%d 15:59:00+00:00')
+
+    with open(path, 'w') as f:
+        for ticker in tickers:
+            spot = round(float(rng.uniform(30, 500)), 2)
+            base = float(rng.uniform(0.18, 0.5))
+            returns = rng.normal(0, base / math.sqrt(252), 252)
+            history = (spot * np.exp(np.cumsum(returns) - returns.sum())).round(4).tolist()
+
+            quotes = []
+            for expiry in expiries:
+                T = max((datetime.strptime(expiry, '%Y-%m-%d') - today).days, 1) / 365
+                for strike in np.round(np.arange(0.5, 1.51, 0.025) * spot, 0):
+                    m = math.log(strike / spot)
+                    sigma = base - 0.15 * m + 0.4 * m * m
+                    for option_type in ('call', 'put'):
+                        price = black_scholes_price(spot, strike, T, 0.05, sigma, option_type)
+                        half = max(0.01, 0.02 * price)
+                        quotes.append({
+                            'contractSymbol': f"{ticker}{expiry.replace('-', '')[2:]}{option_type[0].upper()}{int(strike * 1000):08d}",
+                            'strike': float(strike),
+                            'lastPrice': round(float(price), 2),
+                            'bid': round(max(float(price) - half, 0), 2),
+                            'ask': round(float(price) + half, 2),
+                            'volume': int(rng.integers(1, 500)),
+                            'openInterest': int(rng.integers(10, 5000)),
+                            'lastTradeDate': traded,
+                            'impliedVolatility': round(sigma, 4),
+                            'expiry': expiry,
+                            'type': option_type,
+                        })
+
+            snapshot = {
+                'time': time.time(),
+                'ticker': ticker,
+                'spot': spot,
+                'quotes': quotes,
+                'info': {
+                    'longName': ticker,
+                    'marketCap': float(rng.uniform(1e9, 1e12)), 'forwardPE': float(rng.uniform(5, 40)),
+                    'dividendYield': float(rng.uniform(0, 0.04)), 'beta': float(rng.uniform(0.5, 2)),
+                    'longBusinessSummary': f"Synthetic replay data for {ticker}.",
+                },
+                'history': history,
+            }
+            f.write(json.dumps(snapshot) + "\n")
+
+    return tickers
+
+
+class RssSampler:
+    # Scenarios share one process, so growth over the RSS at entry is what a scenario itself added
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.start = 0
+        self.peak = 0
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def rss(self):
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+
+    def run(self):
+        while not self.stop.is_set():
+            self.peak = max(self.peak, self.rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        gc.collect()
+        self.start = self.peak = self.rss()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+
+def timed_run(widget_or_app, latencies, errors, timeout):
+    start = time.perf_counter()
+    at = widget_or_app.run(timeout=timeout)
+    latencies.append(time.perf_counter() - start)
+    if at.exception:
+        errors.append(at.exception[0].message)
+    return at
+
+
+def session(seed, tickers, steps, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    latencies, errors = [], []
+
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    at = timed_run(at, latencies, errors, timeout)
+    if not at.sidebar.selectbox:
+        return latencies, errors
+
+    # Pick a ticker, then wander around its expiries and strikes.
+    # Streamlit runs every tab on every rerun, so switching tabs costs no rerun of its own;
+    # the radios (volatility source, option type) stand in for the remaining interactions.
+    stock = at.sidebar.selectbox[0]
+    choice = rng.choice(tickers)
+    option = next((o for o in stock.options if o.startswith(f"{choice} (")), stock.options[0])
+    at = timed_run(stock.select(option), latencies, errors, timeout)
+
+    for _ in range(steps):
+        if len(at.sidebar.selectbox) < 4:
+            break
+        action = rng.choice(['expiry', 'strike', 'strike', 'type', 'volatility'])
+        if action == 'expiry':
+            widget = at.sidebar.selectbox[1]
+            widget = widget.select(rng.choice(widget.options))
+        elif action == 'strike':
+            widget = at.sidebar.selectbox[3]
+            widget = widget.select(rng.choice(widget.options))
+        else:
+            widget = at.sidebar.radio[1 if action == 'type' else 0]
+            widget = widget.set_value(rng.choice(widget.options))
+        at = timed_run(widget, latencies, errors, timeout)
+
+    return latencies, errors
+
+
+def run_scenario(name, tickers, users, sessions_per_user, steps, timeout, cold=False):
+    import cache
+
+    if cold:
+        cache.clear()
+    before = cache.cache_info()
+
+    latencies, errors = [], []
+    start = time.perf_counter()
+    with RssSampler() as rss, ThreadPoolExecutor(users) as pool:
+        jobs = [pool.submit(session, f"{name}-{i}", tickers, steps, timeout) for i in range(users * sessions_per_user)]
+        for job in jobs:
+            try:
+                lat, err = job.result()
+            except Exception as e:
+                lat, err = [], [str(e)]
+            latencies += lat
+            errors += err
+    elapsed = time.perf_counter() - start
+
+    after = cache.cache_info()
+    hits = after['hits'] - before['hits']
+    misses = after['misses'] - before['misses']
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (float('nan'),) * 3
+
+    return {
+        'scenario': name,
+        'users': users,
+        'reruns': len(latencies),
+        'errors': len(errors),
+        'p50_ms': round(p50 * 1000, 1),
+        'p95_ms': round(p95 * 1000, 1),
+        'p99_ms': round(p99 * 1000, 1),
+        'reruns_per_sec': round(len(latencies) / elapsed, 2),
+        'peak_rss_mb': round(rss.peak / 2**20, 1),
+        'rss_growth_mb': round((rss.peak - rss.start) / 2**20, 1),
+        'cache_hits': hits,
+        'cache_misses': misses,
+        'cache_hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        'cache_mb': round(after['bytes'] / 2**20, 1),
+        'cache_evictions': after['evictions'] - before['evictions'],
+        'first_errors': sorted(set(errors))[:3],
+    }
+
+
+def scenarios(tickers):
+    return [
+        ('cold_popular', tickers[:2], True),
+        ('warm_popular', tickers[:2], False),
+        ('spread', tickers, False),
+    ]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Drive app.py headlessly with concurrent simulated sessions")
+    parser.add_argument("--users", type=int, nargs="+", default=[20, 50], help="concurrent sessions per run")
+    parser.add_argument("--sessions", type=int, default=1, help="sessions each user plays back to back")
+    parser.add_argument("--steps", type=int, default=6, help="interactions per session after picking a ticker")
+    parser.add_argument("--replay", help="recorded snapshots (stream.py --details); synthetic data is generated if omitted")
+    parser.add_argument("--tickers", type=int, default=10, help="tickers in the synthetic replay")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--out", help="write the report as JSON")
+    args = parser.parse_args()
+
+    path = args.replay
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="prismetrics-"), "replay.jsonl")
+        make_replay(path, args.tickers)
+    with open(path) as f:
+        tickers = [json.loads(line)['ticker'] for line in f if line.strip()]
+    tickers = list(dict.fromkeys(tickers))
+
+    # Must be set before the app (and with it data.py) is first imported
+    os.environ["PRISMETRICS_REPLAY"] = path
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+    report = []
+    for users in args.users:
+        for name, chosen, cold in scenarios(tickers):
+            row = run_scenario(name, chosen, users, args.sessions, args.steps, args.timeout, cold)
+            report.append(row)
+            print(json.dumps(row))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -8,14 +8,14 @@ from pricing import calc_greeks
 sns.set_style("whitegrid")
 sns.set_palette("husl")
 
-def plot_iv_surface(iv_surface, option_type="call", title="Implied Volatility Surface (3D)"):
+def plot_iv_surface(iv_surface, option_type="call", title="Implied Volatility Surface (3D)", today=None):
     fig = plt.figure(figsize=(12,8))
     ax = fig.add_subplot(projection='3d')
 
     all_strikes, all_expiries, all_ivs = [], [], []
 
     for expiry, (strikes, call_ivs, put_ivs) in iv_surface.items():
-        T = get_time_to_expiry(expiry)
+        T = get_time_to_expiry(expiry, today)
         ivs = call_ivs if option_type.lower() == "call" else put_ivs
         for K, iv in zip(strikes, ivs):
             if iv is not None:  # Only plot valid IVs
@@ -78,10 +78,12 @@ def plot_greeks(S,K,T,r,sigma,greeks,greek_name,option_type):
     return fig
 
 
-def plot_volatility_smile(strikes, predicted_ivs, actual_ivs, spot_price, selected_strike, title="Implied Volatility Smile"):
+def plot_volatility_smile(strikes, predicted_ivs, actual_ivs, spot_price, selected_strike, title="Implied Volatility Smile", heston_ivs=None):
     fig, ax = plt.subplots(figsize=(8, 4))
     ax.plot(strikes, predicted_ivs, label='Predicted IV (Model)', marker='o')
     ax.plot(strikes, actual_ivs, label='Actual IV (Market)', marker='o')
+    if heston_ivs is not None:
+        ax.plot(strikes, heston_ivs, label='Heston Fit', linestyle='-', color='purple')
     ax.axvline(spot_price, linestyle='--',color = 'r', label='Current Price')
     ax.axvline(selected_strike, linestyle='--',color = 'g', label='Selected Strike')
     ax.set_xlabel('Strike Price ($)')
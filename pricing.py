@@ -65,8 +65,22 @@ def calc_greeks(S,K,T,r,sigma,option_type ="call"):
         'vega': round(vega / 100, 4),    # per 1% change
         'rho': round(rho / 100, 4)       # per 1% change
     }  
-    
-    
+
+
+def black_scholes_price_delta(S,K,T,r,sigma,option_type="call"):
+    # Array version of black_scholes_price and the delta from calc_greeks; inputs broadcast, T must be > 0
+    sqrt_T = np.sqrt(T)
+    d1 = (np.log(S/K) + (r + 0.5*sigma**2)*T)/(sigma*sqrt_T)
+    d2 = d1 - sigma*sqrt_T
+
+    N_d1 = norm.cdf(d1)
+    N_d2 = norm.cdf(d2)
+
+    if option_type == "call":
+        return S*N_d1 - K*np.exp(-r*T)*N_d2, N_d1
+    return K*np.exp(-r*T)*(1-N_d2) - S*(1-N_d1), N_d1 - 1
+
+
 if __name__ == "__main__":
     S = 100
     K = 105
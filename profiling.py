@@ -0,0 +1,130 @@
+import os
+import re
+import sys
+import json
+import time
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_DIR = os.environ.get("PRISMETRICS_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+
+
+def requested(query_params=None):
+    # Profiling is opt-in: PRISMETRICS_PROFILE=1 for every run, or ?profile=<label> for one app rerun
+    value = os.environ.get("PRISMETRICS_PROFILE")
+    if not value and query_params is not None:
+        value = query_params.get("profile")
+    if not value or value.lower() in ("0", "false", "off"):
+        return None
+    if value.lower() in ("1", "true", "on"):
+        return "all"
+    return value
+
+
+def frame_label(frame):
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}.{code.co_name}:{frame.f_lineno}"
+
+
+class StackSampler:
+    # Samples Python stacks every interval seconds into flamegraph "collapsed" counts
+    def __init__(self, thread_ids=None, interval=0.005):
+        self.thread_ids = thread_ids
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stop.is_set():
+            for tid, frame in sys._current_frames().items():
+                if tid == own or (self.thread_ids is not None and tid not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def start(self):
+        self.thread.start()
+
+    def close(self):
+        self.stop.set()
+        self.thread.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def artifact_name(tags):
+    # Milliseconds and the thread id keep concurrent sessions from overwriting each other's files
+    now = datetime.now()
+    parts = [f"{now:%Y%m%d-%H%M%S}-{now.microsecond//1000:03d}", str(threading.get_ident())]
+    parts += [re.sub(r"[^A-Za-z0-9.-]+", "-", str(tags[k])) for k in ("ticker", "expiry", "label") if tags.get(k)]
+    return "_".join(parts)
+
+
+@contextmanager
+def profile_run(enabled=True, all_threads=False, interval=0.005, **tags):
+    # Yields a dict for tags that are only known inside the run (ticker, expiry, ...)
+    tags = dict(tags)
+    if not enabled:
+        yield tags
+        return
+
+    profiler = cProfile.Profile()
+    sampler = StackSampler(None if all_threads else {threading.get_ident()}, interval)
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows one cProfile per process; a run overlapping another keeps only the sampled stacks
+        profiler = None
+    try:
+        yield tags
+    finally:
+        if profiler:
+            profiler.disable()
+        sampler.close()
+        elapsed = time.perf_counter() - start
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, artifact_name(tags))
+        if profiler:
+            profiler.dump_stats(base + ".pstats")
+        with open(base + ".collapsed", "w") as f:
+            f.write(sampler.collapsed())
+        with open(base + ".json", "w") as f:
+            json.dump(dict(tags, seconds=round(elapsed, 4), samples=sampler.samples, interval=interval, pstats=profiler is not None), f, indent=2, default=str)
+        print(f"Saved profile to {base}" + (".pstats / .collapsed" if profiler else ".collapsed (cProfile busy in another run)"))
+
+
+if __name__ == "__main__":
+    import argparse
+    import runpy
+
+    parser = argparse.ArgumentParser(description="Profile one CLI or benchmark run (e.g. python profiling.py fourier.py)")
+    parser.add_argument("--tag", action="append", default=[], help="key=value to record with the profile, e.g. ticker=AAPL")
+    parser.add_argument("--interval", type=float, default=0.005, help="sampling interval in seconds")
+    parser.add_argument("script")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    tags = dict(t.split("=", 1) for t in args.tag)
+    tags.setdefault("label", os.path.splitext(os.path.basename(args.script))[0])
+    sys.argv = [args.script] + args.args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+
+    # All threads are sampled so work the script hands to threads (e.g. loadtest.py sessions) shows up
+    with profile_run(all_threads=True, interval=args.interval, command=" ".join(sys.argv), **tags):
+        runpy.run_path(args.script, run_name="__main__")
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+# Reason codes, in the order they are checked
+REASONS = ['no_price','out_of_range','zero_bid','wide_spread','low_volume','low_oi','stale','below_intrinsic','above_upper']
+
+
+def column(df, name, default=np.nan):
+    if name in df.columns:
+        return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float)
+    return np.full(len(df), default, dtype=float)
+
+
+def check_quotes(df, spot, T, r=0.05, option_type="call", now=None, min_volume=1, min_open_interest=1, max_spread=0.5, max_age_days=5, moneyness=(0.5, 1.5)):
+    # T and option_type may be scalars or per-row arrays; a 'type' column overrides option_type
+    out = df.copy()
+    n = len(out)
+
+    strike = column(out, 'strike')
+    last = column(out, 'lastPrice')
+    bid = column(out, 'bid', 0.0)
+    ask = column(out, 'ask', 0.0)
+    volume = np.nan_to_num(column(out, 'volume', 0.0))
+    oi = np.nan_to_num(column(out, 'openInterest', 0.0))
+    T = np.broadcast_to(np.asarray(T, dtype=float), n)
+    types = out['type'] if 'type' in out.columns else np.broadcast_to(np.asarray(option_type), n)
+    is_call = np.char.lower(np.asarray(types, dtype=str)) == "call"
+
+    # Two-sided quotes are priced at the mid, otherwise fall back to the last trade
+    quoted = (bid > 0) & (ask > 0) & (ask >= bid)
+    mid = (bid + ask) / 2
+    price = np.where(quoted, mid, last)
+    spread = np.where(quoted, (ask - bid) / np.where(mid > 0, mid, np.nan), 0.0)
+
+    discount = np.exp(-r * np.clip(T, 0, None))
+    intrinsic = np.where(is_call, np.maximum(spot - strike * discount, 0), np.maximum(strike * discount - spot, 0))
+    upper = np.where(is_call, spot, strike * discount)
+
+    if max_age_days is not None and 'lastTradeDate' in out.columns:
+        traded = pd.to_datetime(out['lastTradeDate'], utc=True, errors='coerce')
+        now = pd.Timestamp.now(tz='UTC') if now is None else pd.Timestamp(now)
+        if now.tzinfo is None:
+            # Naive times are local, like datetime.now() everywhere else
+            now = pd.Timestamp(now.to_pydatetime().astimezone())
+        age = ((now - traded).dt.total_seconds() / 86400).to_numpy(dtype=float, na_value=np.inf)
+        stale = age > max_age_days
+    else:
+        stale = np.zeros(n, dtype=bool)
+
+    checks = {
+        'no_price': ~(price > 0) | ~(T > 0),
+        'out_of_range': ~((strike >= moneyness[0] * spot) & (strike <= moneyness[1] * spot)),
+        'zero_bid': (bid <= 0) & (ask > 0),
+        'wide_spread': spread > max_spread,
+        'low_volume': volume < min_volume,
+        'low_oi': oi < min_open_interest,
+        'stale': stale,
+        'below_intrinsic': price < intrinsic,
+        'above_upper': price >= upper,
+    }
+
+    reason = np.full(n, "", dtype=object)
+    for code in REASONS:
+        reason = np.where(checks[code] & (reason == ""), code, reason)
+
+    out['price'] = price
+    out['reason'] = reason
+    return out
+
+
+def reason_counts(checked):
+    return checked['reason'].replace("", "ok").value_counts().to_dict()
@@ -0,0 +1,345 @@
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from functools import partial
+
+import pandas as pd
+import yfinance as yf
+
+from data import get_time_to_expiry
+from pricing import calc_greeks
+from quality import check_quotes
+from volatility import implied_volatility
+
+QUOTE_COLUMNS = ['contractSymbol','strike','lastPrice','bid','ask','volume','openInterest','lastTradeDate','impliedVolatility']
+
+
+# Sources: each yields snapshots of the form
+# {'time': epoch seconds, 'ticker': str, 'spot': float, 'quotes': [quote, ...]}
+# where a quote is one contract row plus its 'expiry' and 'type'.
+
+INFO_KEYS = ['longName','sector','industry','marketCap','forwardPE','dividendYield','beta','longBusinessSummary']
+
+
+def fetch_snapshot(ticker, max_expiries=None, details=False):
+    # details=True also records company info and a year of closes so the app can run from the recording
+    stock = yf.Ticker(ticker)
+    data = stock.history(period='1d')
+    if data.empty:
+        return None
+
+    spot = float(data['Close'].iloc[-1])
+    now = datetime.now()
+    expiries = [e for e in stock.options if datetime.strptime(e, '%Y-%m-%d') > now]
+    if max_expiries:
+        expiries = expiries[:max_expiries]
+
+    quotes = []
+    for expiry in expiries:
+        chain = stock.option_chain(expiry)
+        for option_type, df in (('call', chain.calls), ('put', chain.puts)):
+            df = df[[c for c in QUOTE_COLUMNS if c in df.columns]].copy()
+            if 'lastTradeDate' in df.columns:
+                df['lastTradeDate'] = df['lastTradeDate'].astype(str)
+            df = df.astype(object).where(df.notna(), None)
+            for row in df.to_dict('records'):
+                row['expiry'] = expiry
+                row['type'] = option_type
+                quotes.append(row)
+
+    snapshot = {'time': time.time(), 'ticker': ticker, 'spot': spot, 'quotes': quotes}
+    if details:
+        info = stock.info
+        snapshot['info'] = {key: info[key] for key in INFO_KEYS if key in info}
+        snapshot['history'] = stock.history(period='1y')['Close'].round(4).tolist()
+    return snapshot
+
+
+def live_quotes(tickers, interval=60, rounds=None, max_expiries=None, details=False):
+    n = 0
+    while rounds is None or n < rounds:
+        start = time.monotonic()
+        for ticker in tickers:
+            try:
+                snapshot = fetch_snapshot(ticker, max_expiries, details)
+            except Exception as e:
+                print(f"Error fetching quotes for {ticker}: {str(e)}")
+                continue
+            if snapshot is not None:
+                yield snapshot
+        n += 1
+        if rounds is None or n < rounds:
+            time.sleep(max(0, interval - (time.monotonic() - start)))
+
+
+def replay_quotes(path, speed=60.0, tickers=None):
+    # speed is the replay multiplier over recorded time; None replays as fast as possible
+    prev = None
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            snapshot = json.loads(line)
+            if tickers and snapshot['ticker'] not in tickers:
+                continue
+            if speed and prev is not None:
+                time.sleep(max(0, (snapshot['time'] - prev) / speed))
+            prev = snapshot['time']
+            yield snapshot
+
+
+# Stages: generator functions taking and yielding snapshots.
+
+def changed_only(snapshots, fields=('lastPrice','bid','ask')):
+    last = {}
+    for snapshot in snapshots:
+        changed = []
+        for quote in snapshot['quotes']:
+            key = (snapshot['ticker'], quote['expiry'], quote['type'], quote['strike'])
+            state = (snapshot['spot'],) + tuple(quote.get(f) for f in fields)
+            if last.get(key) != state:
+                last[key] = state
+                changed.append(quote)
+        if changed:
+            yield dict(snapshot, quotes=changed)
+
+
+def prefilter(snapshots, r=0.05, drop=True, **limits):
+    # Drops (or, with drop=False, flags via 'reason') quotes that cannot give a meaningful IV
+    for snapshot in snapshots:
+        if not snapshot['quotes']:
+            yield snapshot
+            continue
+        today = datetime.fromtimestamp(snapshot['time'])
+        df = pd.DataFrame(snapshot['quotes'])
+        T = df['expiry'].map({e: get_time_to_expiry(e, today) for e in df['expiry'].unique()}).to_numpy()
+        checked = check_quotes(df, snapshot['spot'], T, r, now=pd.Timestamp(snapshot['time'], unit='s', tz='UTC'), **limits)
+        prices = checked['price'].to_numpy()
+        reasons = checked['reason'].to_numpy()
+        quotes = []
+        for quote, price, reason in zip(snapshot['quotes'], prices, reasons):
+            if drop and reason:
+                continue
+            quotes.append(dict(quote, price=float(price), reason=reason))
+        if quotes:
+            yield dict(snapshot, quotes=quotes)
+
+
+def solve_iv(snapshots, r=0.05):
+    for snapshot in snapshots:
+        today = datetime.fromtimestamp(snapshot['time'])
+        spot = snapshot['spot']
+        quotes = []
+        for quote in snapshot['quotes']:
+            T = get_time_to_expiry(quote['expiry'], today)
+            price = quote.get('price', quote.get('lastPrice'))
+            iv = None
+            if price and T > 0 and not quote.get('reason'):
+                iv = implied_volatility(spot, quote['strike'], T, r, price, quote['type'])
+            quotes.append(dict(quote, T=T, iv=iv))
+        yield dict(snapshot, quotes=quotes)
+
+
+def add_greeks(snapshots, r=0.05):
+    for snapshot in snapshots:
+        spot = snapshot['spot']
+        quotes = []
+        for quote in snapshot['quotes']:
+            greeks = {}
+            if quote.get('iv'):
+                greeks = calc_greeks(spot, quote['strike'], quote['T'], r, quote['iv'], quote['type'])
+            quotes.append(dict(quote, **greeks))
+        yield dict(snapshot, quotes=quotes)
+
+
+# Sinks: callables taking one snapshot.
+
+def callback_sink(fn):
+    def sink(snapshot):
+        for quote in snapshot['quotes']:
+            fn(snapshot['ticker'], snapshot['spot'], quote)
+    return sink
+
+
+class file_sink:
+    def __init__(self, path):
+        self.f = open(path, 'a')
+
+    def __call__(self, snapshot):
+        self.f.write(json.dumps(snapshot, default=str) + "\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def streamlit_sink(placeholder, columns=('ticker','expiry','type','strike','lastPrice','iv','delta','gamma','theta','vega','rho')):
+    rows = {}
+
+    def sink(snapshot):
+        for quote in snapshot['quotes']:
+            key = (snapshot['ticker'], quote['expiry'], quote['type'], quote['strike'])
+            rows[key] = dict(quote, ticker=snapshot['ticker'])
+        df = pd.DataFrame(list(rows.values()))
+        placeholder.dataframe(df[[c for c in columns if c in df.columns]], hide_index=True)
+    return sink
+
+
+# Plumbing
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.snapshots = 0
+        self.quotes_in = 0
+        self.quotes_out = 0
+        self.busy = 0.0
+
+    def report(self):
+        busy = self.busy or float('nan')
+        return {
+            'stage': self.name,
+            'snapshots': self.snapshots,
+            'quotes_in': self.quotes_in,
+            'quotes_out': self.quotes_out,
+            'busy_sec': round(self.busy, 4),
+            'quotes_per_sec': round((self.quotes_in or self.quotes_out) / busy, 1),
+        }
+
+
+def stage_name(stage):
+    if isinstance(stage, partial):
+        return stage_name(stage.func)
+    return getattr(stage, '__name__', repr(stage))
+
+
+def metered(stage, upstream, stats):
+    # Time spent waiting on upstream is not charged to this stage
+    waited = [0.0]
+
+    def inputs():
+        it = iter(upstream)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                waited[0] += time.perf_counter() - start
+            stats.quotes_in += len(item['quotes'])
+            yield item
+
+    outputs = stage(inputs()) if upstream is not None else iter(stage)
+    while True:
+        start = time.perf_counter()
+        before = waited[0]
+        try:
+            item = next(outputs)
+        except StopIteration:
+            stats.busy += time.perf_counter() - start - (waited[0] - before)
+            return
+        stats.busy += time.perf_counter() - start - (waited[0] - before)
+        stats.snapshots += 1
+        stats.quotes_out += len(item['quotes'])
+        yield item
+
+
+def bounded(items, maxsize=8):
+    # Runs the upstream generator in its own thread; it blocks once maxsize snapshots are waiting
+    buffer = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(('item', item)):
+                    return
+            put(('done', None))
+        except Exception as e:
+            put(('error', e))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            kind, value = buffer.get()
+            if kind == 'done':
+                return
+            if kind == 'error':
+                raise value
+            yield value
+    finally:
+        stop.set()
+
+
+def run_pipeline(source, stages=(), sinks=(), maxsize=8):
+    stats = [StageStats('source')]
+    stream = bounded(metered(source, None, stats[0]), maxsize)
+
+    for stage in stages:
+        stats.append(StageStats(stage_name(stage)))
+        stream = bounded(metered(stage, stream, stats[-1]), maxsize)
+
+    sink_stats = StageStats('sinks')
+    stats.append(sink_stats)
+    try:
+        for snapshot in stream:
+            start = time.perf_counter()
+            for sink in sinks:
+                sink(snapshot)
+            sink_stats.busy += time.perf_counter() - start
+            sink_stats.snapshots += 1
+            sink_stats.quotes_in += len(snapshot['quotes'])
+            sink_stats.quotes_out += len(snapshot['quotes'])
+    finally:
+        # Sinks holding resources (e.g. file_sink) expose close()
+        for sink in sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+
+    return [s.report() for s in stats]
+
+
+def quote_pipeline(source, r=0.05, sinks=(), maxsize=8):
+    stages = [changed_only, partial(prefilter, r=r), partial(solve_iv, r=r), partial(add_greeks, r=r)]
+    return run_pipeline(source, stages, sinks, maxsize)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stream option quotes through IV and Greeks")
+    parser.add_argument("tickers", nargs="*")
+    parser.add_argument("--replay", help="recorded snapshots (.jsonl) to replay instead of live quotes")
+    parser.add_argument("--speed", type=float, default=0, help="replay speed multiplier, 0 for as fast as possible")
+    parser.add_argument("--record", help="append raw snapshots to this .jsonl file")
+    parser.add_argument("--out", help="append processed snapshots to this .jsonl file")
+    parser.add_argument("--interval", type=float, default=60)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--expiries", type=int, default=None, help="only the nearest N expiries")
+    parser.add_argument("--rate", type=float, default=0.05)
+    parser.add_argument("--details", action="store_true", help="also record company info and price history (needed for PRISMETRICS_REPLAY)")
+    args = parser.parse_args()
+
+    if args.replay:
+        source = replay_quotes(args.replay, args.speed or None, args.tickers)
+    else:
+        source = live_quotes(args.tickers or ["AAPL"], args.interval, args.rounds, args.expiries, args.details)
+
+    if args.record:
+        print(run_pipeline(source, sinks=[file_sink(args.record)])[-1])
+    else:
+        sinks = [file_sink(args.out)] if args.out else []
+        for row in quote_pipeline(source, args.rate, sinks):
+            print(row)
@@ -14,10 +14,15 @@ def historical_volatility(prices):
     return round(annual_vol,4)
 
 
-def live_historical_volatility(ticker,period = "6mo"):
+def live_close_prices(ticker,period = "6mo"):
     stock = yf.Ticker(ticker)
     data = stock.history(period=period)
-    close_prices = data["Close"].values
+
+    return data["Close"].values
+
+
+def live_historical_volatility(ticker,period = "6mo"):
+    close_prices = live_close_prices(ticker,period)
     
     return historical_volatility(close_prices)
 